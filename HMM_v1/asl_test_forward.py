@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+import numpy as np
+from hmmlearn.hmm import GaussianHMM
+
+from my_forward import forward_logprob
+from my_model_selectors import SelectorBIC, batch_forward_log_likelihood, fit_warm_model, sequence_log_likelihoods
+
+
+class TestForward(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(14)
+        self.X = rng.randn(60, 2)
+        self.lengths = [20, 25, 15]
+        self.models = [GaussianHMM(n_components=n, covariance_type="diag", random_state=14).fit(self.X, self.lengths)
+                       for n in (2, 3, 4)]
+
+    def test_forward_logprob_matches_score(self):
+        model = self.models[0]
+        X = self.X[:self.lengths[0]]
+        log_L = forward_logprob(np.log(model.transmat_), model._compute_log_likelihood(X), np.log(model.startprob_))
+        self.assertAlmostEqual(log_L, model.score(X))
+
+    def test_sequence_log_likelihoods_match_score(self):
+        bounds = np.cumsum([0] + self.lengths)
+        for model in self.models:
+            log_Ls = sequence_log_likelihoods(model, self.X, bounds)
+            self.assertEqual(len(log_Ls), len(self.lengths))
+            self.assertAlmostEqual(log_Ls.sum(), model.score(self.X, self.lengths))
+
+    def test_batch_forward_log_likelihood_matches_score(self):
+        log_Ls = batch_forward_log_likelihood(self.models, self.X, self.lengths)
+        self.assertEqual(len(log_Ls), len(self.models))
+        for log_L, model in zip(log_Ls, self.models):
+            self.assertAlmostEqual(log_L, model.score(self.X, self.lengths))
+
+    def test_batch_forward_log_likelihood_skips_failed_model(self):
+        # a model of three features cannot score the two-feature X
+        X3 = np.hstack([self.X, self.X[:, :1]])
+        broken = GaussianHMM(n_components=2, covariance_type="diag", random_state=14).fit(X3, self.lengths)
+        log_Ls = batch_forward_log_likelihood([self.models[0], broken, self.models[1]], self.X, self.lengths)
+        self.assertTrue(np.isnan(log_Ls[1]))
+        self.assertAlmostEqual(log_Ls[0], self.models[0].score(self.X, self.lengths))
+        self.assertAlmostEqual(log_Ls[2], self.models[1].score(self.X, self.lengths))
+
+    def test_fit_warm_model_adds_a_state(self):
+        for prev_model in self.models:
+            model = fit_warm_model(prev_model.n_components + 1, self.X, self.lengths, 14, prev_model)
+            self.assertEqual(model.n_components, prev_model.n_components + 1)
+            self.assertAlmostEqual(model.startprob_.sum(), 1)
+            np.testing.assert_allclose(model.transmat_.sum(axis=1), 1)
+
+    def test_selector_bic_warm_start(self):
+        bounds = np.cumsum([0] + self.lengths)
+        sequences = [self.X[start:end].tolist() for start, end in zip(bounds[:-1], bounds[1:])]
+        model = SelectorBIC({'WORD': sequences}, {'WORD': (self.X, self.lengths)}, 'WORD',
+                            min_n_components=2, max_n_components=4, warm_start=True).select()
+        self.assertIsInstance(model, GaussianHMM)
+        self.assertIn(model.n_components, (2, 3, 4))
@@ -1,5 +1,6 @@
 from asl_data import SinglesData, WordsData
 import numpy as np
+from joblib import Parallel, delayed
 from IPython.core.display import display, HTML
 
 RAW_FEATURES = ['left-x', 'left-y', 'right-x', 'right-y']
@@ -45,18 +46,24 @@ def getKey(item):
 def train_all_words(training: WordsData, model_selector):
     """ train all words given a training set and selector
 
+    Words are trained in parallel; the selectors' own per-state parallelism is nested
+    inside each worker, where joblib limits it to avoid oversubscribing the cpus. The selectors'
+    class-level caches live in each worker process, so models are not shared between workers.
+
     :param training: WordsData object (training set)
     :param model_selector: class (subclassed from ModelSelector)
     :return: dict of models keyed by word
     """
     sequences = training.get_all_sequences()
     Xlengths = training.get_all_Xlengths()
-    model_dict = {}
-    for word in training.words:
-        model = model_selector(sequences, Xlengths, word,
-                               n_constant=3).select()
-        model_dict[word] = model
-    return model_dict
+    models = Parallel(n_jobs=-1, batch_size='auto')(
+        delayed(_select_word)(model_selector, sequences, Xlengths, word) for word in training.words)
+    return dict(zip(training.words, models))
+
+
+def _select_word(model_selector, sequences, Xlengths, word):
+    return model_selector(sequences, Xlengths, word,
+                          n_constant=3).select()
 
 
 def combine_sequences(split_index_list, sequences):
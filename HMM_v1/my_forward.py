@@ -0,0 +1,67 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional - without it the kernels below run as plain (slow) Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# fastmath without the 'nnan' and 'ninf' flags: zero transition probabilities are -inf in log space
+FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+
+@njit(cache=True, fastmath=FASTMATH)
+def _logsumexp(a):
+    """ log(sum(exp(a))) of a 1-D array using the max-subtract trick
+
+    :param a: array of floats
+    :return: float
+    """
+    a_max = a.max()
+    if np.isinf(a_max):
+        return a_max
+    total = 0.0
+    for i in range(a.shape[0]):
+        total += np.exp(a[i] - a_max)
+    return a_max + np.log(total)
+
+
+@njit(cache=True, fastmath=FASTMATH)
+def forward_logprob(log_trans, framelogprob, log_start):
+    """ log likelihood of a single sequence by the forward algorithm in log space
+
+    :param log_trans: (H, H) array of log transition probabilities
+    :param framelogprob: (T, H) array of log emission probabilities of each frame in each state
+    :param log_start: (H,) array of log start probabilities
+    :return: float
+    """
+    T, H = framelogprob.shape
+    alpha = log_start + framelogprob[0]
+    alpha_new = np.empty(H)
+    work = np.empty(H)
+    for t in range(1, T):
+        for j in range(H):
+            for i in range(H):
+                work[i] = alpha[i] + log_trans[i, j]
+            alpha_new[j] = _logsumexp(work) + framelogprob[t, j]
+        alpha, alpha_new = alpha_new, alpha
+    return _logsumexp(alpha)
+
+
+@njit(cache=True, fastmath=FASTMATH)
+def forward_logprob_sequences(log_trans, framelogprob, log_start, bounds):
+    """ log likelihood of each of several sequences stored back to back in framelogprob
+
+    :param log_trans: (H, H) array of log transition probabilities
+    :param framelogprob: (T, H) array of log emission probabilities of each frame in each state
+    :param log_start: (H,) array of log start probabilities
+    :param bounds: (S + 1,) integer array of sequence start offsets, ending with T
+    :return: (S,) array of floats
+    """
+    log_L = np.empty(bounds.shape[0] - 1)
+    for s in range(log_L.shape[0]):
+        log_L[s] = forward_logprob(log_trans, framelogprob[bounds[s]:bounds[s + 1]], log_start)
+    return log_L
@@ -1,11 +1,127 @@
 import math
+import os
 import statistics
 import warnings
 
 import numpy as np
 from hmmlearn.hmm import GaussianHMM
+from joblib import Parallel, delayed
 from sklearn.model_selection import KFold
 from asl_utils import combine_sequences
+from my_forward import forward_logprob_sequences
+
+# EM stops once the log likelihood gain falls below EM_TOL or after EM_N_ITER iterations;
+# set the ASL_STRICT_EM environment variable to train with the original 1000 iteration cap
+if os.environ.get('ASL_STRICT_EM'):
+    EM_N_ITER, EM_TOL = 1000, 1e-2
+else:
+    EM_N_ITER, EM_TOL = 100, 1e-3
+
+# Errors raised by hmmlearn and the scoring code when a model cannot be fit or scored,
+# e.g. too few frames for the number of states or a singular covariance
+MODEL_ERRORS = (ValueError, np.linalg.LinAlgError)
+
+
+def batch_forward_log_likelihood(models, X, lengths):
+    """ log likelihood of X under each of several trained GaussianHMMs
+
+    The emission log probabilities for every frame are computed in a single call per model,
+    then the compiled forward recursion is run over each sequence.
+
+    :param models: list of trained GaussianHMM objects
+    :param X: array of feature lists
+    :param lengths: list of lengths of sequences within X
+    :return: array of floats, one per model, nan for a model that could not be scored
+    """
+    X = np.asarray(X)
+    bounds = np.cumsum([0] + list(lengths))
+    log_Ls = np.full(len(models), np.nan)
+    for i, model in enumerate(models):
+        try:
+            log_Ls[i] = sequence_log_likelihoods(model, X, bounds).sum()
+        except MODEL_ERRORS:
+            pass
+    return log_Ls
+
+
+def sequence_log_likelihoods(model, X, bounds):
+    """ log likelihood of each sequence within X under a trained GaussianHMM
+
+    :param model: trained GaussianHMM object
+    :param X: array of features of all sequences, back to back
+    :param bounds: integer array of sequence start offsets into X, ending with len(X)
+    :return: array of floats, one per sequence
+    """
+    framelogprob = model._compute_log_likelihood(X)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_start = np.log(model.startprob_)
+        log_trans = np.log(model.transmat_)
+    return forward_logprob_sequences(log_trans, framelogprob, log_start, bounds)
+
+
+def try_fit_model(num_states, X, lengths, random_state, verbose, word, prev_model=None):
+    """ fit a GaussianHMM with num_states states to X, warm started from prev_model if it has one fewer state
+
+    A module-level function so that the parallel fits of ModelSelector only send their own
+    arguments to the workers, not the selector with the features of every word.
+
+    :param word: the word X belongs to, for verbose output
+    :return: GaussianHMM object, or None if the model could not be fit
+    """
+    # with warnings.catch_warnings():
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    # warnings.filterwarnings("ignore", category=RuntimeWarning)
+    try:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if prev_model is not None and prev_model.n_components == num_states - 1:
+                hmm_model = fit_warm_model(num_states, X, lengths, random_state, prev_model)
+            else:
+                hmm_model = fit_model(num_states, X, lengths, random_state)
+        if verbose:
+            print("model created for {} with {} states".format(word, num_states))
+        return hmm_model
+    except MODEL_ERRORS:
+        if verbose:
+            print("failure on {} with {} states".format(word, num_states))
+        return None
+
+
+def fit_model(num_states, X, lengths, random_state):
+    return GaussianHMM(n_components=num_states, covariance_type="diag", n_iter=EM_N_ITER, tol=EM_TOL,
+                       random_state=random_state, verbose=False).fit(X, lengths)
+
+
+def fit_warm_model(num_states, X, lengths, random_state, prev_model):
+    """ fit a model initialized from prev_model, which has one fewer state
+
+    The most occupied state of prev_model is split in two: the new state copies its
+    transitions, the probability of entering it is shared between the pair, and their
+    means are pushed half a standard deviation apart so EM can separate them.
+    """
+    occupancy = prev_model.predict_proba(X, lengths).sum(axis=0)
+    k = int(np.argmax(occupancy))
+
+    startprob = np.append(prev_model.startprob_, prev_model.startprob_[k] / 2)
+    startprob[k] /= 2
+
+    transmat = np.zeros((num_states, num_states))
+    transmat[:-1, :-1] = prev_model.transmat_
+    transmat[:, k] /= 2
+    transmat[:-1, -1] = transmat[:-1, k]
+    transmat[-1] = transmat[k]
+
+    delta = np.sqrt(prev_model._covars_[k]) / 2
+    means = np.vstack([prev_model.means_, prev_model.means_[k] + delta])
+    means[k] -= delta
+    covars = np.vstack([prev_model._covars_, prev_model._covars_[k]])
+
+    model = GaussianHMM(n_components=num_states, covariance_type="diag", n_iter=min(200, EM_N_ITER), tol=EM_TOL,
+                        init_params='', params='stmc', random_state=random_state, verbose=False)
+    model.startprob_ = startprob
+    model.transmat_ = transmat
+    model.means_ = means
+    model.covars_ = covars
+    return model.fit(X, lengths)
 
 
 class ModelSelector(object):
@@ -13,10 +129,16 @@ class ModelSelector(object):
     base class for model selection (strategy design pattern)
     '''
 
+    # Models trained on a word's full data set, shared by every selector in the same process;
+    # selectors run in the worker processes of train_all_words only share it within each worker.
+    # Keyed by (word, num_states, random_state, id(X)); values keep X alive so its id is not reused,
+    # so entries are only freed by clear_cache.
+    _model_cache = {}
+
     def __init__(self, all_word_sequences: dict, all_word_Xlengths: dict, this_word: str,
                  n_constant=3,
                  min_n_components=2, max_n_components=10,
-                 random_state=14, verbose=False):
+                 random_state=14, verbose=False, warm_start=False):
         self.words = all_word_sequences
         self.hwords = all_word_Xlengths
         self.sequences = all_word_sequences[this_word]
@@ -27,24 +149,67 @@ class ModelSelector(object):
         self.max_n_components = max_n_components
         self.random_state = random_state
         self.verbose = verbose
+        self.warm_start = warm_start
 
     def select(self):
         raise NotImplementedError
 
+    @classmethod
+    def clear_cache(cls):
+        """ drop the models shared between selectors, e.g. before selecting on a new data set """
+        ModelSelector._model_cache.clear()
+
+    def _fit_candidates(self, X, lengths):
+        """ fit a model to X for every candidate number of states
+
+        Candidates are fit in parallel, or in sequence when warm_start is set so that each
+        model is initialized from the one with one fewer state.
+
+        :return: list of GaussianHMM objects ordered by number of states, None where fitting failed
+        """
+        n_values = range(self.min_n_components, self.max_n_components + 1)
+        if self.warm_start:
+            models, prev_model = [], None
+            for n in n_values:
+                prev_model = self._try_fit(n, X, lengths, prev_model)
+                models.append(prev_model)
+            return models
+        if X is not self.X:
+            return Parallel(n_jobs=-1, prefer="processes")(
+                delayed(try_fit_model)(n, X, lengths, self.random_state, self.verbose, self.this_word)
+                for n in n_values)
+
+        # Only fit the candidates not already in the cache
+        missing = [n for n in n_values if self._cached_model(n) is None]
+        fitted = Parallel(n_jobs=-1, prefer="processes")(
+            delayed(try_fit_model)(n, X, lengths, self.random_state, self.verbose, self.this_word)
+            for n in missing)
+        for n, model in zip(missing, fitted):
+            self._model_cache[self._cache_key(n)] = self.X, model
+        return [self._cached_model(n)[1] for n in n_values]
+
     def base_model(self, num_states):
-        # with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", category=DeprecationWarning)
-        # warnings.filterwarnings("ignore", category=RuntimeWarning)
-        try:
-            hmm_model = GaussianHMM(n_components=num_states, covariance_type="diag", n_iter=1000,
-                                    random_state=self.random_state, verbose=False).fit(self.X, self.lengths)
-            if self.verbose:
-                print("model created for {} with {} states".format(self.this_word, num_states))
-            return hmm_model
-        except:
-            if self.verbose:
-                print("failure on {} with {} states".format(self.this_word, num_states))
-            return None
+        cached = self._cached_model(num_states)
+        if cached is None:
+            cached = self.X, self._try_fit(num_states, self.X, self.lengths)
+            self._model_cache[self._cache_key(num_states)] = cached
+        return cached[1]
+
+    def _cache_key(self, num_states):
+        return self.this_word, num_states, self.random_state, id(self.X)
+
+    def _cached_model(self, num_states):
+        """ look up the (X, model) pair trained on this word's data with num_states states
+
+        :return: (X, GaussianHMM object) tuple, or None if no model has been trained yet
+        """
+        cached = self._model_cache.get(self._cache_key(num_states))
+        if cached is not None and cached[0] is self.X:
+            return cached
+        return None
+
+    def _try_fit(self, num_states, X, lengths, prev_model=None):
+        return try_fit_model(num_states, X, lengths, self.random_state, self.verbose, self.this_word, prev_model)
 
 
 class SelectorConstant(ModelSelector):
@@ -76,31 +241,30 @@ class SelectorBIC(ModelSelector):
         """
         warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-        best_model, best_score = None, float('inf')
-
-        # Iterate through range of possible states
-        for n in range(self.min_n_components, self.max_n_components + 1):
-            try:
-                # Create model with each possible number of states
-                model = self.base_model(n)
-                # Method from GaussianHMM class of hmmlearn - computes log probability
-                # under model given features, seq. length of states
-                log_L = model.score(self.X, self.lengths)
-                # Number of parameters (p)
-                p = n ** 2 + 2 * n * model.n_features - 1
-                # Log of number of data points (N)
-                log_N = np.log(self.X.shape[0])
-
-                bic = -2.0 * log_L + p * log_N
-
-                # LOWER scores indicate better models
-                if bic < best_score:
-                    best_score = bic
-                    best_model = model
-            except:
-                #print('Exception encountered when calculating BIC for model of ' + self.this_word
-                #      + ' with ' + str(n) + ' states.')
-                pass
+        best_model = None
+
+        # Create model with each possible number of states
+        models = [model for model in self._fit_candidates(self.X, self.lengths) if model is not None]
+
+        # Compute log probability of the features under every model in a single forward pass,
+        # nan for a model that could not be scored
+        log_Ls = batch_forward_log_likelihood(models, self.X, self.lengths)
+
+        if len(log_Ls):
+            # Log of number of data points (N) and number of features are the same for every model
+            log_N = math.log(self.X.shape[0])
+            n_features = self.X.shape[1]
+
+            # Number of parameters (p) of every model, from its number of states
+            n = np.fromiter((model.n_components for model in models), dtype=int, count=len(models))
+            p = n * n + 2 * n * n_features - 1
+
+            bic = -2.0 * log_Ls + p * log_N
+
+            # LOWER scores indicate better models; models scored nan or inf are never selected
+            scored = bic < np.inf
+            if scored.any():
+                best_model = models[int(np.argmin(np.where(scored, bic, np.inf)))]
 
         if not best_model:
             best_model = self.base_model(self.n_constant)
@@ -118,43 +282,89 @@ class SelectorDIC(ModelSelector):
     DIC = log(P(X(i)) - 1/(M-1)SUM(log(P(X(all but i))
     '''
 
+    # Features of every word stacked into one array, shared by all DIC selectors on the same data
+    # in the same process. Keyed by id(all_word_Xlengths); values keep the dict alive so its id is
+    # not reused, so entries are only freed by clear_cache. Entries also record the number of words
+    # stacked, so the stack is rebuilt if words are added to the dict.
+    _stacked_cache = {}
+
+    def __init__(self, all_word_sequences: dict, all_word_Xlengths: dict, this_word: str, *args, **kwargs):
+        super().__init__(all_word_sequences, all_word_Xlengths, this_word, *args, **kwargs)
+        # Position of this word within the per-model score vector built in _score_model
+        self.word_index = list(self.hwords).index(this_word)
+        self.all_X, self.bounds, self.sequence_words = self._stack_words(all_word_Xlengths)
+
+    @classmethod
+    def clear_cache(cls):
+        """ drop the models and stacked features shared between selectors """
+        super().clear_cache()
+        SelectorDIC._stacked_cache.clear()
+
+    @classmethod
+    def _stack_words(cls, all_word_Xlengths):
+        """ stack the features of every word so each model evaluates its emissions in a single call
+
+        :return: (array, array, array) tuple of all features, sequence start offsets into them
+            ending with their length, and the index of the word each sequence belongs to
+        """
+        cached = cls._stacked_cache.get(id(all_word_Xlengths))
+        if cached is None or cached[0] is not all_word_Xlengths or cached[1] != len(all_word_Xlengths):
+            all_X = np.vstack([X for X, _ in all_word_Xlengths.values()])
+            lengths = [length for _, word_lengths in all_word_Xlengths.values() for length in word_lengths]
+            bounds = np.cumsum([0] + lengths)
+            sequence_words = np.repeat(np.arange(len(all_word_Xlengths)),
+                                       [len(word_lengths) for _, word_lengths in all_word_Xlengths.values()])
+            cached = all_word_Xlengths, len(all_word_Xlengths), all_X, bounds, sequence_words
+            cls._stacked_cache[id(all_word_Xlengths)] = cached
+        return cached[2:]
+
     def select(self):
         warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-        best_model, best_score = None, float('-inf')
-
-        # Iterate through range of possible states
-        for n in range(self.min_n_components, self.max_n_components + 1):
-            try:
-                # Create model with each possible number of states
-                model = self.base_model(n)
-                # Initialize array to track log(L) for other words in dict
-                other_word_scores = []
-                # Iterate through words in dict
-                for word, (X, lengths) in self.hwords.items():
-                    if word != self.this_word:
-                        other_word_scores.append(model.score(X, lengths))
-                # Calculate DIC score by subtracting mean log(L) of all other words in dict
-                # from log(L) of given word
-                dic = model.score(self.X, self.lengths) - np.mean(other_word_scores)
-
-                # HIGHER scores indicate better models
-                if dic > best_score:
-                    best_score = dic
-                    best_model = model
-
-            except:
-                #print('Exception encountered when calculating DIC for model of ' + self.this_word
-                #     + ' with ' + str(n) + ' states.')
-                pass
+        results = self._score_candidates()
 
-        if not best_model:
+        # HIGHER scores indicate better models; models scored nan or inf were already left out
+        if results:
+            best_score, best_model = max(results, key=lambda result: result[0])
+        else:
             best_model = self.base_model(self.n_constant)
             #print("DIC Selection failed for " + self.this_word + "; default # states (" +
             #      str(self.n_constant) + ") used to create base model.")
 
         return best_model
 
+    def _score_candidates(self):
+        """ fit every candidate number of states, then run _score_model on each
+
+        Fitting goes through _fit_candidates so models already trained by another selector
+        are reused. Scoring runs in this process, as it is a single emission pass per model
+        and would otherwise have to pickle the stacked features of every word to the workers.
+
+        :return: list of (score, GaussianHMM object) tuples, only for the candidates with a finite score
+        """
+        models = self._fit_candidates(self.X, self.lengths)
+        results = [self._score_model(model) for model in models if model is not None]
+        return [result for result in results if result is not None and math.isfinite(result[0])]
+
+    def _score_model(self, model):
+        """ score a trained model
+
+        :return: (score, GaussianHMM object) tuple, or None if the model could not be scored
+        """
+        try:
+            # Score the model once against every word in dict, including this word
+            sequence_scores = sequence_log_likelihoods(model, self.all_X, self.bounds)
+            scores = np.bincount(self.sequence_words, weights=sequence_scores, minlength=len(self.hwords))
+            # Calculate DIC score by subtracting mean log(L) of all other words in dict
+            # from log(L) of given word
+            this_score = scores[self.word_index]
+            dic = this_score - (math.fsum(scores) - this_score) / (len(scores) - 1)
+            return dic, model
+        except MODEL_ERRORS:
+            #print('Exception encountered when calculating DIC for model of ' + self.this_word
+            #     + ' with ' + str(model.n_components) + ' states.')
+            return None
+
 class SelectorCV(ModelSelector):
     ''' select best model based on average log Likelihood of cross-validation folds
 
@@ -165,34 +375,37 @@ class SelectorCV(ModelSelector):
 
         best_model, best_score = None, float('-inf')
 
-        # Define method for determining split indicies
-        split_method = KFold()
-
-        # Iterate through range of possible states
-        for n in range(self.min_n_components, self.max_n_components + 1):
-            try:
-                model = self.base_model(n)
-                # Initialize array to track scores for different splits
-                kfold_scores = []
-                # Iterate through potential train, test indices that separate the frames
-                for train_idx, test_idx in split_method.split(self.sequences):
-                    # Create test sets using a given set test indices
-                    test_x, test_l = combine_sequences(test_idx, self.sequences)
-                    # Append model score on test sets
-                    kfold_scores.append(model.score(test_x, test_l))
-
-                # Average all KFold scores for a single state
-                kfold_mean = np.mean(kfold_scores)
-
-                # HIGHER scores indicate better models
-                if kfold_mean > best_score:
-                    best_score = kfold_mean
-                    best_model = model
-
-            except:
-                #print('Exception encountered when calculating KFold score for model of ' + self.this_word
-                #      + ' with ' + str(n) + ' states.')
-                pass
+        try:
+            # Define method for determining split indicies; words with fewer than 3 sequences get fewer folds
+            split_method = KFold(n_splits=min(3, len(self.sequences)))
+            # Create the train and test sets of every fold once, they do not depend on the number of states
+            folds = [combine_sequences(train_idx, self.sequences) + combine_sequences(test_idx, self.sequences)
+                     for train_idx, test_idx in split_method.split(self.sequences)]
+            # Track scores for different splits, one row per fold and one column per number of states
+            kfold_scores = []
+            for train_x, train_l, test_x, test_l in folds:
+                # Train every candidate on the remaining folds so the held-out fold is unseen
+                fold_models = self._fit_candidates(train_x, train_l)
+                fitted = [model for model in fold_models if model is not None]
+                # Score the held-out fold under all candidates in a single forward pass, nan where scoring failed
+                fold_scores = iter(batch_forward_log_likelihood(fitted, test_x, test_l))
+                kfold_scores.append([float('nan') if model is None else next(fold_scores)
+                                     for model in fold_models])
+
+            # Average all KFold scores for each number of states
+            kfold_means = [math.fsum(n_scores) / len(n_scores) for n_scores in zip(*kfold_scores)]
+        except MODEL_ERRORS:
+            #print('Exception encountered when calculating KFold scores for models of ' + self.this_word)
+            kfold_means = []
+
+        # Models trained on all sequences are the ones returned if selected
+        models = self._fit_candidates(self.X, self.lengths) if len(kfold_means) else []
+
+        for model, kfold_mean in zip(models, kfold_means):
+            # HIGHER scores indicate better models
+            if model is not None and kfold_mean > best_score:
+                best_score = kfold_mean
+                best_model = model
 
         if not best_model:
             best_model = self.base_model(self.n_constant)
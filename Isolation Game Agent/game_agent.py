@@ -10,6 +10,111 @@ class SearchTimeout(Exception):
     pass
 
 
+# Knight-move offsets used by isolation.Board to generate legal moves
+KNIGHT_DIRECTIONS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                     (1, -2), (1, 2), (2, -1), (2, 1))
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(x):
+        return bin(x).count('1')
+
+# Knight-move target masks by board (height, width); see knight_masks
+_knight_masks = {}
+
+
+def knight_masks(height, width):
+    """
+    Bitboard masks of the cells a knight can reach from each cell
+
+    Bitboards hold one byte per cell, in the column-major order of
+    `isolation.Board._board_state`, so the occupancy bitboard can be built from
+    the board state in a single bytes conversion; masks set the low bit of each
+    target cell's byte.
+
+    Parameters
+    ----------
+    height, width : int
+        Dimensions of the board
+
+    Returns
+    -------
+    list<int>
+        The mask of knight-move targets of every cell, indexed by row + column * height
+    """
+
+    masks = _knight_masks.get((height, width))
+    if masks is None:
+        masks = []
+        for col in range(width):
+            for row in range(height):
+                mask = 0
+                for d_row, d_col in KNIGHT_DIRECTIONS:
+                    r, c = row + d_row, col + d_col
+                    if 0 <= r < height and 0 <= c < width:
+                        mask |= 1 << (8 * (r + c * height))
+                masks.append(mask)
+        _knight_masks[(height, width)] = masks
+    return masks
+
+
+knight_masks(7, 7)
+
+
+def bitboard_from_game(game):
+    """
+    Occupancy bitboard of the game: the byte of each used cell is 1, blanks are 0
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    Returns
+    -------
+    int
+        The occupancy bitboard, in the layout described in knight_masks
+    """
+
+    return int.from_bytes(bytes(game._board_state[:game.height * game.width]), 'little')
+
+
+def move_counts(game, player):
+    """
+    Number of legal moves of the player and of its opponent, counted with
+    bitboards rather than generating the lists of moves
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    player : object
+        A player instance in the current game (i.e., an object corresponding to
+        one of the player objects `game.__player_1__` or `game.__player_2__`.)
+
+    Returns
+    -------
+    (int, int)
+        The number of legal moves of the player and of its opponent
+    """
+
+    occupied = bitboard_from_game(game)
+    masks = knight_masks(game.height, game.width)
+    counts = []
+    for p in (player, game.get_opponent(player)):
+        loc = game.get_player_location(p)
+        if loc is None:
+            # A player who has not moved yet may move to any blank cell
+            counts.append(game.height * game.width - popcount(occupied))
+        else:
+            counts.append(popcount(masks[loc[0] + loc[1] * game.height] & ~occupied))
+    return counts[0], counts[1]
+
+
 def opp_diff(game, player):
     """
     Heuristic evaluation function that calculates the difference between the number of legal moves available
@@ -31,14 +136,16 @@ def opp_diff(game, player):
         The heuristic value of the current game state to the specified player.
     """
 
-    # Check for win/loss
-    if game.is_winner(player):
+    # Check for win/loss - the player to move loses when it has no legal moves
+    player_moves, opponent_moves = move_counts(game, player)
+    if game.active_player is player:
+        if not player_moves:
+            return float('-inf')
+    elif not opponent_moves:
         return float('inf')
-    elif game.is_loser(player):
-        return float('-inf')
 
     # Heuristic evaluation
-    return float(len(game.get_legal_moves(player)) - len(game.get_legal_moves(game.get_opponent(player))))
+    return float(player_moves - opponent_moves)
 
 
 def opp_diff_defensive(game, player):
@@ -62,19 +169,19 @@ def opp_diff_defensive(game, player):
         The heuristic value of the current game state to the specified player.
     """
 
-    # Check for win/loss
-    if game.is_winner(player):
+    # Check for win/loss - the player to move loses when it has no legal moves
+    player_moves, opponent_moves = move_counts(game, player)
+    if game.active_player is player:
+        if not player_moves:
+            return float('-inf')
+    elif not opponent_moves:
         return float('inf')
-    elif game.is_loser(player):
-        return float('-inf')
 
     # Initialize variable for heuristic evaluation
-    player_moves = game.get_legal_moves(player)
-    opponent_moves = game.get_legal_moves(game.get_opponent(player))
     theta = 2
 
     # Heuristic evaluation
-    return float(theta * len(player_moves) - len(opponent_moves))
+    return float(theta * player_moves - opponent_moves)
 
 
 def opp_diff_aggressive(game, player):
@@ -98,19 +205,19 @@ def opp_diff_aggressive(game, player):
         The heuristic value of the current game state to the specified player.
     """
 
-    # Check for win/loss
-    if game.is_winner(player):
+    # Check for win/loss - the player to move loses when it has no legal moves
+    player_moves, opponent_moves = move_counts(game, player)
+    if game.active_player is player:
+        if not player_moves:
+            return float('-inf')
+    elif not opponent_moves:
         return float('inf')
-    elif game.is_loser(player):
-        return ('-inf')
 
     # Initialize variable for heuristic evaluation
-    player_moves = game.get_legal_moves(player)
-    opponent_moves = game.get_legal_moves(game.get_opponent(player))
     theta = 2
 
     # Heuristic evaluation
-    return float(len(player_moves) - theta * len(opponent_moves))
+    return float(player_moves - theta * opponent_moves)
 
 
 def opp_diff_decay(game, player):
@@ -136,16 +243,17 @@ def opp_diff_decay(game, player):
         The heuristic value of the current game state to the specified player.
     """
 
-    # Check for win/loss
-    if game.is_winner(player):
+    # Check for win/loss - the player to move loses when it has no legal moves
+    player_moves, opponent_moves = move_counts(game, player)
+    if game.active_player is player:
+        if not player_moves:
+            return float('-inf')
+    elif not opponent_moves:
         return float('inf')
-    elif game.is_loser(player):
-        return float('-inf')
 
     # Initialize variables for heuristic evaluation
-    player_moves = len(game.get_legal_moves(player))
-    opponent_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    game_ratio = float(((game.height * game.width) - len(game.get_blank_spaces())) / (game.height * game.width))
+    # Every move fills one cell, so the filled fraction of the board follows from the move count
+    game_ratio = game.move_count / (game.height * game.width)
     theta = 3
 
     # Heuristic evaluation
@@ -184,6 +292,28 @@ def custom_score_2 (game, player):
 def custom_score_3 (game, player):
     return opp_diff_decay(game, player)
 
+def state_key(game):
+    """
+    Hashable key identifying a board state, including which player is to move
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        An instance of `isolation.Board` encoding the current state of the
+        game (e.g., player locations and blocked cells).
+
+    Returns
+    -------
+    hashable
+        game.hash() when the board provides it, otherwise its raw state
+    """
+
+    try:
+        return game.hash()
+    except AttributeError:
+        return str(game._board_state)
+
+
 class IsolationPlayer:
     """Base class for minimax and alphabeta agents -- this class is never
     constructed or tested directly.
@@ -337,7 +467,7 @@ class MinimaxPlayer(IsolationPlayer):
 
         for move in legal_moves:
             future_state_min = future_state.forecast_move(move)
-            lowest_score = min(lowest_score, float(self.max_play(future_state_min, depth - 1)))
+            lowest_score = min(lowest_score, self.max_play(future_state_min, depth - 1))
 
         return lowest_score
 
@@ -375,9 +505,53 @@ class MinimaxPlayer(IsolationPlayer):
 
         for move in legal_moves:
             future_state_max = future_state.forecast_move(move)
-            highest_score = max(highest_score, float(self.min_play(future_state_max, depth - 1)))
+            highest_score = max(highest_score, self.min_play(future_state_max, depth - 1))
 
-        return float(highest_score)
+        return highest_score
+
+
+class SearchNode(object):
+    """
+    A node on the explicit stack of AlphaBetaPlayer.ab_search
+
+    Attributes
+    ----------
+    state : isolation.Board
+        The game state of the node
+
+    depth : int
+        The number of plies left to search below the node
+
+    alpha, beta : float
+        The current search window, narrowed as the children are scored
+
+    maximizing : bool
+        True if the node is on a maximizing layer
+
+    moves : iterator
+        The legal moves not yet searched
+
+    key : tuple
+        The transposition table key of the node
+
+    alpha0, beta0 : float
+        The search window when the node was entered, to tell exact scores from bounds
+
+    move : (int, int)
+        The move that led to the child searched last
+    """
+
+    __slots__ = ('state', 'depth', 'alpha', 'beta', 'maximizing', 'moves', 'key', 'alpha0', 'beta0', 'move')
+
+    def __init__(self, state, depth, alpha, beta, maximizing, moves, key):
+        self.state = state
+        self.depth = depth
+        self.alpha = self.alpha0 = alpha
+        self.beta = self.beta0 = beta
+        self.maximizing = maximizing
+        self.moves = moves
+        self.key = key
+        self.move = None
 
 
 class AlphaBetaPlayer(IsolationPlayer):
@@ -386,6 +560,16 @@ class AlphaBetaPlayer(IsolationPlayer):
     make sure it returns a good move before the search time limit expires.
     """
 
+    # Transposition table entry flags: the stored score is exact, or only a
+    # lower / upper bound on the true score because the search was cut off
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.):
+        super().__init__(search_depth, score_fn, timeout)
+        self.transposition_table = {}
+        self.root_scores = {}
+        self.killer_moves = {}
+
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
         result before the time limit expires.
@@ -409,6 +593,11 @@ class AlphaBetaPlayer(IsolationPlayer):
         """
 
         self.time_left = time_left
+        self.transposition_table = {}
+        # Root move scores from the previous iteration order the next one;
+        # killer moves are the last move to cause a cutoff at each depth
+        self.root_scores = {}
+        self.killer_moves = {}
 
         legal_moves = game.get_legal_moves(self)
 
@@ -469,13 +658,17 @@ class AlphaBetaPlayer(IsolationPlayer):
         if not legal_moves:
             return (-1, -1)
 
+        # Search the moves that scored best in the previous iteration first
+        legal_moves.sort(key=lambda m: -self.root_scores.get(m, 0))
+
         # Initialize best_score and best_move
         best_score = float('-inf')
         best_move = legal_moves[0]
 
         for move in legal_moves:
             future_state = game.forecast_move(move)
-            score = self.ab_min_play(future_state, depth - 1, alpha, beta)
+            score = self.ab_search(future_state, depth - 1, alpha, beta)
+            self.root_scores[move] = score
 
             if score > beta:
                 return move
@@ -488,9 +681,14 @@ class AlphaBetaPlayer(IsolationPlayer):
         return best_move
 
 
-    def ab_min_play(self, future_state, depth, alpha, beta):
+    def ab_search(self, future_state, depth, alpha, beta):
         """
-        Minimizing player in minimax game with alphabeta pruning
+        Minimax game with alphabeta pruning, starting from the minimizing player
+
+        The game tree is walked with an explicit stack of nodes instead of
+        recursion. Each node is a `SearchNode`, and completed nodes are
+        recorded in the transposition table so repeated positions are not
+        searched again.
 
         Parameters
         ----------
@@ -510,77 +708,90 @@ class AlphaBetaPlayer(IsolationPlayer):
 
         Returns
         -------
-        lowest_score : int
-            An integer reflecting the lowest score of a forecasted move
-            given the evaluation function custom_score
+        float
+            The score of the forecasted state given the evaluation function
+            custom_score
         """
 
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
+        stack = []
+        score = self.ab_enter(stack, future_state, depth, alpha, beta, False)
 
-        legal_moves = future_state.get_legal_moves()
-        lowest_score = float('inf')
+        while stack:
+            node = stack[-1]
 
-        # Base case for recursion in depth-limited search - return score of current position
-        if depth == 0 or not legal_moves:
-            return self.score(future_state, self)
+            # Fold the score of the child just searched into its parent
+            if score is not None:
+                if node.maximizing:
+                    node.alpha = max(node.alpha, score)
+                else:
+                    node.beta = min(node.beta, score)
+                if node.alpha >= node.beta:
+                    self.killer_moves[node.depth] = node.move
 
-        for move in legal_moves:
-            future_state_min = future_state.forecast_move(move)
-            lowest_score = min(lowest_score, float(self.ab_max_play(future_state_min, depth - 1, alpha, beta)))
+            move = next(node.moves, None) if node.alpha < node.beta else None
 
-            beta = min(beta, lowest_score)
+            if move is None:
+                # All moves searched or pruned - maximizing nodes return alpha, minimizing nodes beta
+                stack.pop()
+                score = node.alpha if node.maximizing else node.beta
+                self.ab_store(node, score)
+                continue
 
-            if beta <= alpha:
-                break
+            node.move = move
+            score = self.ab_enter(stack, node.state.forecast_move(move), node.depth - 1, node.alpha, node.beta,
+                                  not node.maximizing)
 
-        return beta
+        return score
 
 
-    def ab_max_play(self, future_state, depth, alpha, beta):
+    def ab_enter(self, stack, future_state, depth, alpha, beta, maximizing):
         """
-        Maximizing player in minimax game
-
-        Parameters
-        ----------
-        future_state : isolation.Board
-            An instance of the Isolation game `Board` class representing a
-            future game state
-
-        depth : int
-            Depth is an integer representing the maximum number of plies to
-            search in the game tree before aborting
-
-        alpha : float
-            Alpha limits the lower bound of search on minimizing layers
-
-        beta : float
-            Beta limits the upper bound of search on maximizing layers
-
-        Returns
-        -------
-        highest_score : int
-            An integer reflecting the highest score of a forecasted move
-            given the evaluation function custom_score
+        Begin searching a node: returns its score when it can be settled
+        immediately (leaf or transposition table hit), otherwise pushes it onto
+        the stack and returns None
         """
 
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
 
+        key = (state_key(future_state), depth)
+        entry = self.transposition_table.get(key)
+        if entry is not None:
+            score, flag = entry
+            if flag == self.EXACT:
+                return score
+            if flag == self.LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score
+
         legal_moves = future_state.get_legal_moves()
-        highest_score = float('-inf')
 
-        # Base case for recursion in depth-limited search - return score of current position
+        # Base case for depth-limited search - return score of current position
         if depth == 0 or not legal_moves:
             return self.score(future_state, self)
 
-        for move in legal_moves:
-            future_state_max = future_state.forecast_move(move)
-            highest_score = max(highest_score, float(self.ab_min_play(future_state_max, depth - 1, alpha, beta)))
+        # Try the move that last caused a cutoff at this depth first
+        killer = self.killer_moves.get(depth)
+        if killer in legal_moves and killer != legal_moves[0]:
+            legal_moves = [killer] + [move for move in legal_moves if move != killer]
 
-            alpha = max(alpha, highest_score)
+        stack.append(SearchNode(future_state, depth, alpha, beta, maximizing, iter(legal_moves), key))
+        return None
 
-            if alpha >= beta:
-                break
 
-        return alpha
+    def ab_store(self, node, score):
+        """
+        Record the score of a completed node in the transposition table along
+        with whether it is exact or a bound
+        """
+
+        if score <= node.alpha0:
+            flag = self.UPPER
+        elif score >= node.beta0:
+            flag = self.LOWER
+        else:
+            flag = self.EXACT
+        self.transposition_table[node.key] = (score, flag)
@@ -1,4 +1,22 @@
+import numpy as np
+
+try:
+    from numba import get_num_threads, njit, prange
+except ImportError:
+    # numba is optional - without it the solver below runs as plain (slow) Python on a single thread
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+    def get_num_threads():
+        return 1
+
+    prange = range
+
 assignments = []
+# Only keep a copy of the board in assignments for each search level when something is going to visualize them
+RECORD_ASSIGNMENTS = False
 
 rows = 'ABCDEFGHI'
 cols = '123456789'
@@ -17,209 +35,515 @@ diagonal_units = [[r + c for r, c in zip(rows, cols)], [r + c for r, c in zip(ro
 
 unit_list = row_units + col_units + square_units + diagonal_units
 
-units = dict((s, [u for u in unit_list if s in u]) for s in boxes)
-peers = dict((s, set(sum(units[s], [])) - set([s])) for s in boxes)
+# Candidates of a box are stored as a 9-bit mask: bit k is set while digit k+1 is still possible
+ALL_DIGITS = 0x1FF
+DIGIT_MASKS = tuple(1 << k for k in range(9))
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(512)], dtype=np.uint8)
+DIGITS = [''.join(d for d, bit in zip(cols, DIGIT_MASKS) if mask & bit) for mask in range(512)]
+# the bit indices set in each mask, padded with -1
+BITS_IN = np.array([[k for k in range(9) if mask >> k & 1] + [-1] * (9 - POPCOUNT[mask])
+                    for mask in range(512)], dtype=np.int8)
 
-#print(units)
-#print(peers)
+# Units (29, 9) and peers (81, 32) as arrays of box indices 0..80 into the values array, built once at import
+BOX_INDEX = dict((s, i) for i, s in enumerate(boxes))
+UNITS = np.array([[BOX_INDEX[s] for s in unit] for unit in unit_list], dtype=np.int8)
 
-def assign_value(values, box, value):
+def make_peers():
     """
-    Please use this function to update your values dictionary!
-    Assigns a value to a given box. If it updates the board record it.
+    Build the table of the boxes sharing a unit with each box.
+    Boxes on the diagonals have up to 32 peers, so shorter rows are padded by repeating their first peer
+    - eliminating a digit from it twice is harmless, and counting stops at the first repeat.
+    Returns:
+        (81, 32) array of box indices
     """
+    peer_rows = []
+    for s in boxes:
+        box_peers = set().union(*[unit for unit in unit_list if s in unit]) - set([s])
+        peer_rows.append(sorted(BOX_INDEX[p] for p in box_peers))
 
-    # Don't waste memory appending actions that don't actually change any values
+    max_peers = max(len(row) for row in peer_rows)
+    return np.array([row + row[:1] * (max_peers - len(row)) for row in peer_rows], dtype=np.int8)
 
-    if values[box] == value:
-        return values
+PEERS = make_peers()
 
-    values[box] = value
-    if len(value) == 1:
-        assignments.append(values.copy())
-    return values
+def make_intersections():
+    """
+    Build the table of the units sharing two or more boxes with each unit - a square and a row, column or diagonal.
+    Each entry is the other unit's index, then the shared boxes as a mask of positions in this unit and in the other,
+    padded with -1 entries.
+    Returns:
+        (29, 8, 3) array
+    """
+    table = []
+    for unit_a in unit_list:
+        entries = []
+        for b, unit_b in enumerate(unit_list):
+            shared = set(unit_a) & set(unit_b)
+            if unit_a != unit_b and len(shared) > 1:
+                entries.append([b, sum(1 << i for i, s in enumerate(unit_a) if s in shared),
+                                sum(1 << i for i, s in enumerate(unit_b) if s in shared)])
+        table.append(entries)
+
+    max_entries = max(len(entries) for entries in table)
+    return np.array([entries + [[-1, 0, 0]] * (max_entries - len(entries)) for entries in table], dtype=np.int16)
+
+INTERSECTIONS = make_intersections()
+
+def make_box_units():
+    """
+    Build the table of the units each box is in, with the box's position in the unit.
+    Boxes on the diagonals are in up to 5 units, so shorter rows are padded with -1 entries.
+    Returns:
+        (81, 5, 2) array
+    """
+    table = [[[u, unit.index(s)] for u, unit in enumerate(unit_list) if s in unit] for s in boxes]
+
+    max_entries = max(len(entries) for entries in table)
+    return np.array([entries + [[-1, -1]] * (max_entries - len(entries)) for entries in table], dtype=np.int8)
+
+BOX_UNITS = make_box_units()
 
-def make_dictionary(grid):
+# Every value queued during one reduction is a box down to a single value (at most once per box) or a digit
+# down to a single place in a unit (at most once per unit and digit), so the queue never holds more than this
+QUEUE_SIZE = len(boxes) + len(unit_list) * 9
+
+def make_values(grid):
     """
-    Convert grid into a dict of {square: char} with '123456789' for empties.
+    Convert grid into an array of candidate bitmasks with 0x1FF (all nine digits) for empties.
     Args:
         grid(string) - A grid in string form.
     Returns:
-        A grid in dictionary form
-            Keys: The boxes, e.g., 'A1'
-            Values: The value in each box, e.g., '8'. If the box has no value, then the value will be '123456789'.
+        A grid in array form
+            Index: The box index, e.g., 0 for 'A1'
+            Value: The candidate mask of each box, e.g., 0b10000000 for '8'. If the box has no value, then the mask will be 0x1FF.
     """
     values = []
-    all_digits = '123456789'
     grid = list(grid)
 
     for char in grid:
         if char == '.':
-            values.append(all_digits)
-        elif char in all_digits:
-            values.append(char)
+            values.append(ALL_DIGITS)
+        elif char in cols:
+            values.append(DIGIT_MASKS[int(char) - 1])
 
     #print(len(values))
     assert len(values) == 81
 
-    g_dict = (dict(zip(boxes, values)))
+    return np.array(values, dtype=np.uint16)
 
-    return g_dict
+def make_dictionary(values):
+    """
+    Convert the array form of a sudoku into the dict form used by visualize.
+    Args:
+        values(array): The sudoku in array form
+    Returns:
+        A grid in dictionary form
+            Keys: The boxes, e.g., 'A1'
+            Values: The digits still possible in each box, e.g., '8' or '1379'.
+    """
+    return dict(zip(boxes, (DIGITS[mask] for mask in values)))
 
 def display(values):
     """
     Display the values as a 2-D grid.
     Args:
-        values(dict): The sudoku in dictionary form
+        values(array): The sudoku in array form
     """
-    print(values)
-    width = 1 + max(len(values[square]) for square in boxes)
+    width = 1 + POPCOUNT[values].max()
     line = '+'.join(['-' * (width * 3)] * 3)
 
     for r in rows:
-        print(''.join(values[r + c].center(width) + ('|' if c in '36' else '')
+        print(''.join(DIGITS[values[BOX_INDEX[r + c]]].center(width) + ('|' if c in '36' else '')
                       for c in cols))
         if r in 'CF' : print(line)
 
     print()
     print
 
-def eliminate(values):
+@njit(cache=True, inline='always')
+def mark_box(bitset, box):
+    """
+    Set the bit of a box in a bitset of boxes, e.g. in the eliminated bitset once its value is gone from its peers.
+    Args:
+        bitset: two uint64 words, box b being bit b % 64 of word b // 64.
+        box: index of the box.
+    """
+    bitset[box >> 6] |= np.uint64(1) << np.uint64(box & 63)
+
+@njit(cache=True, inline='always')
+def is_marked(bitset, box):
+    """
+    Test the bit of a box in a bitset of boxes.
+    Args:
+        bitset: two uint64 words, box b being bit b % 64 of word b // 64.
+        box: index of the box.
+    Returns:
+        True if the box is in the bitset.
+    """
+    return bitset[box >> 6] >> np.uint64(box & 63) & np.uint64(1) != 0
+
+# called from every strategy, so left as a real call - inlining it everywhere makes the compiled solver much slower
+@njit(cache=True)
+def remove_values(values, places, queue, tail, units, box_units, popcount, bits_in, box, mask):
     """
-        Iterate through all boxes and whenever there is a box with a single value,
-        eliminate that value from its peers.
+    Take the values of a mask away from a box, keeping the places of each digit in the box's units up to date.
+    Queues the box once it is down to a single value, and a digit once it has a single place left in a unit.
+    Args:
+        values: Sudoku in array form, reduced in place.
+        places: (29, 9) array of the positions in each unit where each digit is still possible, updated in place.
+        queue: (QUEUE_SIZE, 2) array of the boxes and values to assign, appended to at tail.
+        tail: number of entries in queue.
+        units, box_units, popcount, bits_in: lookup tables.
+        box: index of the box.
+        mask: the values to take away - the ones the box doesn't have are ignored.
+    Returns:
+        The new number of entries in queue. -1 if no solution exists.
+    """
+    mask = np.int64(mask & values[box])
+    while mask:
+        k = int(bits_in[mask, 0])
+        mask ^= 1 << k
+        values[box] ^= 1 << k
+
+        value = values[box]
+        if value == 0:
+            return -1
+        if popcount[value] == 1:
+            queue[tail, 0] = box
+            queue[tail, 1] = value
+            tail += 1
+
+        for j in range(box_units.shape[1]):
+            u = box_units[box, j, 0]
+            if u < 0:
+                break
+            places[u, k] ^= 1 << int(box_units[box, j, 1])
+
+            where = places[u, k]
+            if where == 0:
+                return -1
+            if popcount[where] == 1:
+                queue[tail, 0] = units[u, bits_in[where, 0]]
+                queue[tail, 1] = 1 << k
+                tail += 1
+
+    return tail
+
+@njit(cache=True, inline='always')
+def eliminate(values, eliminated, places, queue, tail, peers, units, box_units, popcount, bits_in, box):
+    """
+        Eliminate the single value of a box from its peers.
         Args:
-            Sudoku in dictionary form.
+            values: Sudoku in array form, reduced in place.
+            eliminated: bitset of the boxes whose value is already gone from their peers, updated in place.
+            places, queue, tail: as for remove_values.
+            peers: (81, 32) array of the peer box indices of each box.
+            units, box_units, popcount, bits_in: lookup tables.
+            box: index of a box down to a single value.
         Returns:
-            Reduced sudoku in dictionary form.
+            The new number of entries in queue. -1 if no solution exists.
     """
-    solved_values = [box for box in values.keys() if len(values[box]) == 1]
+    # a box keeps its single value once solved, so it only has to be taken out of its peers once
+    mark_box(eliminated, box)
 
-    for box in solved_values:
-        digit = values[box]
+    digit = values[box]
+    for peer in peers[box]:
+        if values[peer] & digit:
+            tail = remove_values(values, places, queue, tail, units, box_units, popcount, bits_in, peer, digit)
+            if tail < 0:
+                break
 
-        for peer in peers[box]:
-            values[peer] = values[peer].replace(digit, '')
+    return tail
 
-    return values
-
-def only_choice(values):
+@njit(cache=True, inline='always')
+def only_choice(values, places, queue, tail, units, popcount, bits_in):
     """
-    Iterate through all units, and if there is a unit with only one possible value left,
-    assign the value to this box.
+    Record where each digit is still possible in each unit, and queue the digits with only one place left.
     Args:
-        Sudoku in dictionary form.
+        values: Sudoku in array form.
+        places, queue, tail: as for remove_values, places being filled in from values.
+        units, popcount, bits_in: lookup tables.
     Returns:
-        Reduced sudoku in dictionary form.
+        The new number of entries in queue. -1 if no solution exists.
     """
-    for unit in unit_list:
-        for digit in '123456789':
-            dplaces = [box for box in unit if digit in values[box]]
-            if len(dplaces) == 1:
-                values = assign_value(values, dplaces[0], digit)
-
-    return values
-
-def naked_twins(values):
+    places[:] = 0
+    for u in range(units.shape[0]):
+        for i in range(9):
+            value = np.int64(values[units[u, i]])
+            while value:
+                k = bits_in[value, 0]
+                value ^= 1 << int(k)
+                places[u, k] |= 1 << i
+
+        for k in range(9):
+            where = places[u, k]
+            if where == 0:
+                return -1
+            if popcount[where] == 1:
+                queue[tail, 0] = units[u, bits_in[where, 0]]
+                queue[tail, 1] = 1 << k
+                tail += 1
+
+    return tail
+
+@njit(cache=True, inline='always')
+def naked_twins(values, places, queue, tail, units, box_units, popcount, bits_in, u, pair_masks, pair_counts):
     """Eliminate values using the naked twins strategy.
     Args:
-        values(dict): a dictionary of the form {'box_name': '123456789', ...}
+        values(array): an array of 81 candidate masks, 0x1FF for a box that could be any digit
+        places, queue, tail: as for remove_values
+        units, box_units, popcount, bits_in(array): lookup tables
+        u(int): index of the unit
+        pair_masks, pair_counts(array): scratch space for 9 masks and their counts
     Returns:
-        the values dictionary with the naked twins eliminated from peers
+        The new number of entries in queue. -1 if no solution exists.
     """
+    # the distinct two-candidate masks of the unit and how many of its boxes have each
+    n_pairs = 0
+    for box in units[u]:
+        if popcount[values[box]] == 2:
+            for k in range(n_pairs):
+                if pair_masks[k] == values[box]:
+                    pair_counts[k] += 1
+                    break
+            else:
+                pair_masks[n_pairs] = values[box]
+                pair_counts[n_pairs] = 1
+                n_pairs += 1
+
+    # two boxes sharing the same two candidates take both digits away from the rest of the unit
+    for k in range(n_pairs):
+        if pair_counts[k] == 2:
+            naked_values = pair_masks[k]
+            for box in units[u]:
+                if values[box] != naked_values and values[box] & naked_values:
+                    tail = remove_values(values, places, queue, tail, units, box_units, popcount, bits_in,
+                                         box, naked_values)
+                    if tail < 0:
+                        return tail
+
+    return tail
+
+@njit(cache=True, inline='always')
+def locked_candidates(values, places, queue, tail, units, box_units, intersections, popcount, bits_in, u):
+    """Eliminate values using the locked candidates (pointing and claiming) strategy:
+    when a value can only go in the boxes a unit shares with another unit, the rest of the other unit can't have it.
+    Args:
+        values(array): an array of 81 candidate masks, 0x1FF for a box that could be any digit
+        places, queue, tail: as for remove_values
+        units, box_units(array): lookup tables
+        intersections(array): (29, 8, 3) table of the other units sharing boxes with each unit
+        popcount, bits_in(array): lookup tables
+        u(int): index of the unit
+    Returns:
+        The new number of entries in queue. -1 if no solution exists.
+    """
+    for j in range(intersections.shape[1]):
+        other = intersections[u, j, 0]
+        if other < 0:
+            break
+        shared = int(intersections[u, j, 1])
+        shared_in_other = int(intersections[u, j, 2])
+
+        # digits whose places in the unit are all shared boxes
+        locked = 0
+        for k in range(9):
+            if not places[u, k] & ~shared:
+                locked |= 1 << k
+
+        if locked:
+            for i in range(9):
+                box = units[other, i]
+                if not shared_in_other >> i & 1 and values[box] & locked:
+                    tail = remove_values(values, places, queue, tail, units, box_units, popcount, bits_in,
+                                         box, locked)
+                    if tail < 0:
+                        return tail
+
+    return tail
+
+@njit(cache=True)
+def propagate(values, places, queue, tail, units, box_units, intersections, popcount, bits_in):
+    """
+    Apply naked_twins to every unit, then locked_candidates to every unit.
+    The second sweep is skipped when the first queues a value, as draining the queue is cheaper.
+    Args:
+        values: Sudoku in array form, reduced in place.
+        places, queue, tail: as for remove_values.
+        units, box_units, intersections, popcount, bits_in: lookup tables.
+    Returns:
+        The new number of entries in queue. -1 if no solution exists.
+    """
+    pair_masks = np.empty(9, dtype=np.int64)
+    pair_counts = np.empty(9, dtype=np.int64)
+
+    start = tail
+    for u in range(units.shape[0]):
+        tail = naked_twins(values, places, queue, tail, units, box_units, popcount, bits_in, u,
+                           pair_masks, pair_counts)
+        if tail < 0:
+            return tail
+    if tail > start:
+        return tail
+
+    for u in range(units.shape[0]):
+        tail = locked_candidates(values, places, queue, tail, units, box_units, intersections, popcount,
+                                 bits_in, u)
+        if tail < 0:
+            break
+
+    return tail
+
+@njit(cache=True, inline='always')
+def digest(values):
+    """
+    Sum of the candidate masks of a grid. Candidates are only ever taken away, so the sum drops
+    whenever anything changes and comparing two sums tells whether the grid changed in between.
+    Args:
+        values: Sudoku in array form.
+    Returns:
+        The sum.
+    """
+    total = 0
+    for value in values:
+        total += value
+    return total
 
-    no_more_twins = False
-    while not no_more_twins:
-
-        board_before = values
-
-        for unit in unit_list:
-            maybe_naked = {}
-            naked_count = 1
-
-            for box in unit:
-                if len(values[box]) == 2:
-                    for label, possibilities in maybe_naked.items():
-                        if possibilities == values[box]:
-                            naked_count += 1
-                            naked_values = list(possibilities)
-                            naked_twins = [label, box]
-                    maybe_naked[box] = values[box]
-
-            if naked_count == 2:
-                #print()
-                #print(naked_values)
-                #print()
-                for box in unit:
-                    if (box != naked_twins[0]) and (box != naked_twins[1]):
-                        #print(values[box])
-                        values[box] = values[box].replace(naked_values[0], '')
-                        values[box] = values[box].replace(naked_values[1], '')
-                        #print(values[box])
-
-            naked_count = 1
-
-        board_after = values
-        if board_before == board_after:
-            no_more_twins = True
-    return values
-
-def reduce_puzzle(values):
+@njit(cache=True)
+def reduce_puzzle(values, eliminated, places, queue, peers, units, box_units, intersections, popcount, bits_in):
     """
-       Reduces sudoku grid using constraint propagation of
-       eliminate, only_choice, and naked_twins
+       Reduces sudoku grid in place using constraint propagation of
+       eliminate, only_choice, naked_twins and locked_candidates.
+       Boxes down to a single value and digits down to a single place in a unit go through a first-in first-out
+       queue, so each is assigned and eliminated as soon as it is found.
        Args:
-           values: a sudoku grid in dictionary form
+           values: a sudoku grid in array form
+           eliminated: bitset of the boxes of values whose value is already gone from their peers, updated in place
+           places, queue: scratch space for remove_values
+           peers, units, box_units, intersections, popcount, bits_in: lookup tables
        Returns:
-           The dictionary representation of the reduced sudoku grid. False if no solution exists.
+           True if the reduced grid may still have a solution. False if no solution exists.
        """
-    solved_values = [box for box in values.keys()]
-
+    tail = 0
+    for box in range(values.shape[0]):
+        if popcount[values[box]] == 1 and not is_marked(eliminated, box):
+            queue[tail, 0] = box
+            queue[tail, 1] = values[box]
+            tail += 1
+    tail = only_choice(values, places, queue, tail, units, popcount, bits_in)
+
+    head = 0
     stalled = False
     while not stalled:
-        solved_values_before = len([box for box in values.keys() if len(values[box]) == 1])
-        values = eliminate(values)
-        values = only_choice(values)
-        values = naked_twins(values)
-
-        solved_values_after = len([box for box in values.keys() if len(values[box]) == 1])
+        # assign each queued value and take it out of the box's peers, which may queue more
+        while 0 <= head < tail:
+            box = queue[head, 0]
+            digit = queue[head, 1]
+            head += 1
+
+            # sanity check - the value may have gone from the box since it was queued if the grid is unsolvable
+            if not values[box] & digit:
+                return False
+            tail = remove_values(values, places, queue, tail, units, box_units, popcount, bits_in,
+                                 box, values[box] ^ digit)
+            if tail >= 0 and not is_marked(eliminated, box):
+                tail = eliminate(values, eliminated, places, queue, tail, peers, units, box_units, popcount,
+                                 bits_in, box)
+
+        # sanity check - no box should ever have zero possibilities, nor digit zero places, unless unsolvable
+        if tail < 0:
+            return False
 
-        stalled = solved_values_before == solved_values_after
-        # sanity check - no box should ever have zero possibilities unless unsolvable
-        if len([box for box in values.keys() if len(values[box]) == 0]):
+        before = digest(values)
+        tail = propagate(values, places, queue, tail, units, box_units, intersections, popcount, bits_in)
+        if tail < 0:
             return False
 
-    return values
+        stalled = head == tail and before == digest(values)
 
-def search(values):
+    return True
+
+@njit(cache=True)
+def search(stack, eliminated, peers, units, box_units, intersections, popcount, bits_in):
     """
     Reduces sudoku grid using constraint propagation (reduce puzzle)
-    then tests values for squares with fewest possible values remaining
+    then tests values for squares with fewest possible values remaining,
+    trying first the values that rule out the fewest candidates of the square's peers.
+    Uses an explicit stack of grids, one row per level of the search, instead of recursion.
     Args:
-        values: a sudoku grid in dictionary form
+        stack: (82, 81) array with the sudoku grid to solve in row 0
+        eliminated: (82, 2) array for the eliminated bitset of each row of stack
+        peers, units, box_units, intersections, popcount: the lookup tables of reduce_puzzle
+        bits_in: (512, 9) lookup table of the bit indices set in a mask
     Returns:
-        The dictionary representation of the solved sudoku grid. False if no solution exists.
+        The stack row holding the solved grid, rows 0 to it being the reduced grids along the way. -1 if no solution exists.
     """
-
-    values = reduce_puzzle(values)
-
-    if values == False:
-        return False # previous failed test
-
-    if all(len(values[s]) == 1 for s in boxes):
-        print("Solved!")
-        return values # puzzle solved :)
-
-    # choose square to search with fewest possibilities
-    n,s = min((len(values[s]), s) for s in boxes if len(values[s]) > 1)
-
-    # use recurrence to solve each of the resulting sudokus - if it returns a value (i.e. not False), return that answer
-    for value in values[s]:
-        new_sudoku = values.copy()
-        new_sudoku[s] = value
-        attempt = search(new_sudoku)
-        if attempt:
-            return attempt
+    # the box branched on at each level, its values in the order to try them and the position of the next one
+    branch_box = np.empty(stack.shape[0], dtype=np.int64)
+    branch_values = np.empty((stack.shape[0], 9), dtype=np.int64)
+    branch_next = np.empty(stack.shape[0], dtype=np.int64)
+    costs = np.empty(9, dtype=np.int64)
+    places = np.empty((units.shape[0], 9), dtype=np.int16)
+    queue = np.empty((QUEUE_SIZE, 2), dtype=np.int16)
+
+    eliminated[0] = 0
+    if not reduce_puzzle(stack[0], eliminated[0], places, queue, peers, units, box_units, intersections, popcount,
+                         bits_in):
+        return -1 # previous failed test
+
+    depth = 0
+    while True:
+        values = stack[depth]
+
+        # choose square to search with fewest possibilities
+        s = -1
+        n = 10
+        for box in range(values.shape[0]):
+            count = popcount[values[box]]
+            if 1 < count < n:
+                n = count
+                s = box
+
+        if s < 0:
+            return depth # puzzle solved :)
+
+        # order its values by how many peers could still take them, least constraining first
+        for i in range(n):
+            k = int(bits_in[values[s], i])
+            cost = 0
+            for p in range(peers.shape[1]):
+                peer = peers[s, p]
+                if p and peer == peers[s, 0]:
+                    break # the rest of the row is padding, which would count the first peer again
+                cost += values[peer] >> k & 1
+            j = i
+            while j > 0 and costs[j - 1] > cost:
+                costs[j] = costs[j - 1]
+                branch_values[depth, j] = branch_values[depth, j - 1]
+                j -= 1
+            costs[j] = cost
+            branch_values[depth, j] = 1 << k
+
+        branch_box[depth] = s
+        branch_next[depth] = 0
+
+        # try each value of the square on a copy one level down - backtrack when all of them fail
+        while True:
+            if branch_next[depth] == popcount[stack[depth, branch_box[depth]]]:
+                depth -= 1
+                if depth < 0:
+                    return -1
+                continue
+
+            value = branch_values[depth, branch_next[depth]]
+            branch_next[depth] += 1
+            stack[depth + 1] = stack[depth]
+            stack[depth + 1, branch_box[depth]] = value
+            eliminated[depth + 1] = eliminated[depth]
+            if reduce_puzzle(stack[depth + 1], eliminated[depth + 1], places, queue, peers, units, box_units,
+                             intersections, popcount, bits_in):
+                depth += 1
+                break
 
 def solve(grid):
     """
@@ -228,14 +552,63 @@ def solve(grid):
         grid(string): a string representing a sudoku grid.
             Example: '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
     Returns:
-        The dictionary representation of the final sudoku grid. False if no solution exists.
+        The array representation of the final sudoku grid, one candidate mask per box. False if no solution exists.
     """
-    sudoku_grid = make_dictionary(grid)
-    solved_sudoku = search(sudoku_grid)
+    # every level of the search assigns one more box, so it can never go deeper than the number of boxes
+    stack = np.empty((len(boxes) + 1, len(boxes)), dtype=np.uint16)
+    stack[0] = make_values(grid)
+    eliminated = np.empty((len(boxes) + 1, 2), dtype=np.uint64)
+
+    depth = search(stack, eliminated, PEERS, UNITS, BOX_UNITS, INTERSECTIONS, POPCOUNT, BITS_IN)
+    if depth < 0:
+        return False
+
+    print("Solved!")
+    if RECORD_ASSIGNMENTS:
+        assignments.extend(make_dictionary(values) for values in stack[:depth + 1])
+    return stack[depth].copy()
+
+@njit(cache=True, parallel=True)
+def search_batch(grids, stacks, eliminated, peers, units, box_units, intersections, popcount, bits_in):
+    """
+    Run search on many sudoku grids, one worker thread per row of stacks and eliminated,
+    each taking every n-th grid in turn so the threads never share scratch space.
+    Args:
+        grids: (N, 81) array of sudoku grids in array form
+        stacks: (workers, 82, 81) array for the search stack of each worker
+        eliminated: (workers, 82, 2) array for the eliminated bitsets of each worker
+        peers, units, box_units, intersections, popcount, bits_in: the lookup tables of search
+    Returns:
+        (N, 81) array of the solved grids, all zeros for a grid with no solution.
+    """
+    solved = np.zeros_like(grids)
+    workers = stacks.shape[0]
+    for w in prange(workers):
+        for i in range(w, grids.shape[0], workers):
+            stacks[w, 0] = grids[i]
+            depth = search(stacks[w], eliminated[w], peers, units, box_units, intersections, popcount, bits_in)
+            if depth >= 0:
+                solved[i] = stacks[w, depth]
+    return solved
+
+def solve_batch(grids):
+    """
+    Find the solutions to many Sudoku grids, solving them in parallel.
+    Args:
+        grids(list): strings representing sudoku grids, as for solve.
+    Returns:
+        (N, 81) array with the array representation of each final sudoku grid. All zeros for a grid with no solution.
+    """
+    values = np.array([make_values(grid) for grid in grids], dtype=np.uint16).reshape(-1, len(boxes))
+
+    workers = max(1, min(get_num_threads(), len(values)))
+    stacks = np.empty((workers, len(boxes) + 1, len(boxes)), dtype=np.uint16)
+    eliminated = np.empty((workers, len(boxes) + 1, 2), dtype=np.uint64)
 
-    return solved_sudoku
+    return search_batch(values, stacks, eliminated, PEERS, UNITS, BOX_UNITS, INTERSECTIONS, POPCOUNT, BITS_IN)
 
 if __name__ == '__main__':
+    RECORD_ASSIGNMENTS = True
     diag_sudoku_grid = '9.1....8.8.5.7..4.2.4....6...7......5..............83.3..6......9................'
 
     diag_sudoku_solved = solve(diag_sudoku_grid)
@@ -248,5 +621,5 @@ if __name__ == '__main__':
 
     except SystemExit:
         pass
-    except:
+    except Exception:
         print('We could not visualize your board due to a pygame issue. Not a problem! It is not a requirement.')
@@ -0,0 +1,44 @@
+import unittest
+
+import solution
+
+
+class TestSolve(unittest.TestCase):
+    grids = ['2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3',
+             '9.1....8.8.5.7..4.2.4....6...7......5..............83.3..6......9................']
+    # the same digit twice in a row, and a box left with no digit its row allows
+    unsolvable = ['99' + '.' * 79,
+                  '12345678' + '.' * 9 + '9' + '.' * 63]
+
+    def assertSolves(self, values, grid):
+        digits = [solution.DIGITS[mask] for mask in values]
+        for digit, given in zip(digits, grid):
+            self.assertEqual(len(digit), 1)
+            if given != '.':
+                self.assertEqual(digit, given)
+        for unit in solution.UNITS:
+            self.assertEqual(sorted(digits[box] for box in unit), list(solution.cols))
+
+    def test_solve(self):
+        for grid in self.grids:
+            values = solution.solve(grid)
+            self.assertIsNot(values, False)
+            self.assertSolves(values, grid)
+
+    def test_solve_unsolvable(self):
+        for grid in self.unsolvable:
+            self.assertIs(solution.solve(grid), False)
+
+    def test_solve_batch(self):
+        solved = solution.solve_batch(self.grids + self.unsolvable)
+        self.assertEqual(solved.shape, (len(self.grids) + len(self.unsolvable), len(solution.boxes)))
+        for values, grid in zip(solved, self.grids):
+            self.assertSolves(values, grid)
+        self.assertFalse(solved[len(self.grids):].any())
+
+    def test_solve_batch_empty(self):
+        self.assertEqual(solution.solve_batch([]).shape, (0, len(solution.boxes)))
+
+
+if __name__ == '__main__':
+    unittest.main()